@@ -4,8 +4,12 @@ Beijing Subway Timetable Downloader
 Downloads timetable images from all Beijing subway operators
 """
 
-import requests
+import httpx
 import re
+import os
+import socket
+import functools
+import threading
 import argparse
 from pathlib import Path
 from urllib.parse import urljoin
@@ -13,8 +17,6 @@ from bs4 import BeautifulSoup
 import logging
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import time
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
 import json
 
 # Configure logging
@@ -22,6 +24,38 @@ logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
 )
 logger = logging.getLogger(__name__)
+# httpx logs every request at INFO; keep it to warnings like requests/urllib3 did
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+# Number of concurrent download workers per source
+MAX_WORKERS = 8
+
+# Station names where the trailing "站" is part of the name (railway stations)
+KEEP_ZHAN_STATIONS = frozenset(
+    {"朝阳站", "清河站", "丰台站", "北京站", "北京西站", "北京南站", "亦庄火车站"}
+)
+
+# Timetable image path on bjsubway.com, e.g. /d/file/station/.../1号线-八宝山-1.jpg
+IMG_NAME_RE = re.compile(
+    r"/d/file/station/(?:[^/]*/)*([^/-]+)-([^/-]+)[^/]*\.(?:jpg|png)", re.IGNORECASE
+)
+
+# Images smaller than this are buffered in memory instead of streamed to disk
+MAX_BUFFERED_SIZE = 8 * 1024 * 1024
+
+# Transient HTTP statuses that page requests are retried on
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+def install_dns_cache():
+    """Cache DNS lookups for the process; a full run only talks to a handful of hosts"""
+    original_getaddrinfo = socket.getaddrinfo
+
+    @functools.lru_cache(maxsize=128)
+    def cached_getaddrinfo(*args, **kwargs):
+        return original_getaddrinfo(*args, **kwargs)
+
+    socket.getaddrinfo = cached_getaddrinfo
 
 
 class SubwayTimetableDownloader:
@@ -30,40 +64,79 @@ class SubwayTimetableDownloader:
         self.output_dir.mkdir(exist_ok=True)
         self.session = self._create_session()
         self.url_log_file = self.output_dir / "downloaded_urls.txt"
-        self.url_log = open(self.url_log_file, "a", encoding="utf-8")
+        self.url_log = None  # Opened lazily on first write
+        self._url_log_lock = threading.Lock()
         self.update_cache_file = self.output_dir / "line_updates.json"
         self.update_cache = self._load_update_cache()
+        self._cache_dirty = False
+        self._created_dirs = {self.output_dir}
+        self._force = False  # Re-download images that already exist on disk
 
     def _create_session(self):
-        """Create a session with retry strategy and connection pooling"""
-        session = requests.Session()
-
-        # Configure retry strategy
-        retry_strategy = Retry(
-            total=3,  # Total number of retries
-            backoff_factor=1,  # Wait 1, 2, 4 seconds between retries
-            status_forcelist=[429, 500, 502, 503, 504],  # Retry on these status codes
-            allowed_methods=["HEAD", "GET", "OPTIONS"],  # Methods to retry
+        """Create an HTTP/2 client with connection retries and connection pooling"""
+        # The client is shared by all worker threads, so size the pool for them.
+        # HTTP/2 multiplexes concurrent requests to the same host over one connection.
+        transport = httpx.HTTPTransport(
+            http2=True,
+            retries=3,  # Retry failed connection attempts
+            limits=httpx.Limits(
+                max_keepalive_connections=16,
+                max_connections=max(32, MAX_WORKERS * 2),
+            ),
         )
 
-        # Mount adapters with retry strategy and connection pooling
-        adapter = HTTPAdapter(
-            max_retries=retry_strategy,
-            pool_connections=10,  # Limit connection pool size
-            pool_maxsize=10,
-            pool_block=True,  # Block when pool is full instead of creating new connections
-        )
-        session.mount("http://", adapter)
-        session.mount("https://", adapter)
-
-        # Set headers
-        session.headers.update(
-            {
+        return httpx.Client(
+            transport=transport,
+            timeout=30.0,
+            follow_redirects=True,
+            headers={
                 "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-            }
+            },
         )
 
-        return session
+    def _get_page(self, url, max_retries=3):
+        """GET a page, retrying network errors and transient error statuses
+
+        Raises for any other error status, or when the retries run out.
+        """
+        for attempt in range(max_retries + 1):
+            try:
+                response = self.session.get(url, timeout=30)
+            except httpx.TransportError as e:
+                # Timeouts, connection resets and protocol errors
+                if attempt == max_retries:
+                    raise
+                reason = f"{type(e).__name__}: {e}"
+            else:
+                if response.status_code not in RETRY_STATUSES or attempt == max_retries:
+                    break
+                reason = f"HTTP {response.status_code}"
+            wait_time = 2**attempt  # Exponential backoff: 1, 2, 4 seconds
+            logger.warning(f"Request for {url} failed ({reason}). Retrying in {wait_time}s...")
+            time.sleep(wait_time)
+        response.raise_for_status()
+        return response
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Flush and close the URL log file and the HTTP client"""
+        with self._url_log_lock:
+            if self.url_log is not None and not self.url_log.closed:
+                self.url_log.close()
+        self.session.close()
+
+    def _log_url(self, filename, url):
+        """Append a filename/URL pair to the URL log (thread-safe)"""
+        line = f"{filename}\t{url}\n".encode("utf-8")
+        with self._url_log_lock:
+            if self.url_log is None:
+                self.url_log = open(self.url_log_file, "ab", buffering=64 * 1024)
+            self.url_log.write(line)
 
     def _load_update_cache(self):
         """Load the cache of line update dates"""
@@ -77,14 +150,24 @@ class SubwayTimetableDownloader:
         return {}
 
     def _save_update_cache(self):
-        """Save the cache of line update dates"""
+        """Atomically save the cache of line update dates if it has changed"""
+        if not self._cache_dirty:
+            return
         try:
-            with open(self.update_cache_file, "w", encoding="utf-8") as f:
+            temp_file = self.update_cache_file.with_suffix(".json.tmp")
+            with open(temp_file, "w", encoding="utf-8") as f:
                 json.dump(self.update_cache, f, ensure_ascii=False, indent=2)
+            os.replace(temp_file, self.update_cache_file)
+            self._cache_dirty = False
             logger.info(f"Update cache saved to {self.update_cache_file}")
         except Exception as e:
             logger.error(f"Failed to save update cache: {e}")
 
+    def _set_update_cache(self, key, value):
+        """Record a line update date; saved only after the line's images are downloaded"""
+        self.update_cache[key] = value
+        self._cache_dirty = True
+
     def _extract_update_date(self, soup):
         """Extract update date from a station page (format: YYYY年MM月更新)"""
         try:
@@ -104,9 +187,7 @@ class SubwayTimetableDownloader:
         """Get the update date for a line by checking station pages"""
         try:
             # Construct URL for the line's station list
-            response = self.session.get(
-                "https://www.bjsubway.com/station/xltcx/", timeout=30
-            )
+            response = self._get_page("https://www.bjsubway.com/station/xltcx/")
             soup = BeautifulSoup(response.content, "html.parser")
 
             # Find all station links for this line and try each one
@@ -126,7 +207,7 @@ class SubwayTimetableDownloader:
             for station_url in station_links[:3]:
                 try:
                     # Get station page
-                    station_response = self.session.get(station_url, timeout=30)
+                    station_response = self._get_page(station_url)
                     station_soup = BeautifulSoup(station_response.content, "html.parser")
 
                     # Extract update date
@@ -159,7 +240,7 @@ class SubwayTimetableDownloader:
         if cached_update is None:
             # First time downloading this line
             logger.info(f"Line {line_code}: First download, update date {current_update}")
-            self.update_cache[f"bjsubway_line_{line_code}"] = current_update
+            self._set_update_cache(f"bjsubway_line_{line_code}", current_update)
             return True
 
         if current_update != cached_update:
@@ -167,7 +248,7 @@ class SubwayTimetableDownloader:
             logger.info(
                 f"Line {line_code}: Update date changed from {cached_update} to {current_update}, downloading..."
             )
-            self.update_cache[f"bjsubway_line_{line_code}"] = current_update
+            self._set_update_cache(f"bjsubway_line_{line_code}", current_update)
             return True
 
         # Update date unchanged
@@ -179,38 +260,65 @@ class SubwayTimetableDownloader:
     def download_image(self, url, filename, max_retries=3):
         """Download an image from URL and save with given filename with retry logic"""
         filepath = self.output_dir / filename
-        filepath.parent.mkdir(parents=True, exist_ok=True)
+        if filepath.parent not in self._created_dirs:
+            filepath.parent.mkdir(parents=True, exist_ok=True)
+            self._created_dirs.add(filepath.parent)
+
+        # Size of a copy from a previous run; file names don't change between
+        # timetable revisions, so it is only skipped if the server reports the same size
+        local_size = None
+        if not self._force:
+            try:
+                local_size = filepath.stat().st_size
+            except FileNotFoundError:
+                pass
 
         for attempt in range(max_retries):
             try:
-                # Add timeout to prevent hanging
-                response = self.session.get(url, stream=True, timeout=30)
-                response.raise_for_status()
-
                 # Write to temporary file first
                 temp_filepath = filepath.with_suffix(filepath.suffix + ".tmp")
 
-                with open(temp_filepath, "wb") as f:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        if chunk:  # Filter out keep-alive chunks
-                            f.write(chunk)
-
-                # Verify file size matches Content-Length if available
-                if "content-length" in response.headers:
-                    expected_size = int(response.headers["content-length"])
-                    actual_size = temp_filepath.stat().st_size
-                    if actual_size != expected_size:
-                        temp_filepath.unlink()
-                        raise Exception(
-                            f"Incomplete download: expected {expected_size} bytes, got {actual_size} bytes"
-                        )
+                # Add timeout to prevent hanging
+                with self.session.stream("GET", url, timeout=30) as response:
+                    response.raise_for_status()
+
+                    expected_size = None
+                    if "content-length" in response.headers:
+                        expected_size = int(response.headers["content-length"])
+
+                    if local_size and expected_size == local_size:
+                        # Unchanged since the last run; the body is never read
+                        self._log_url(filename, url)
+                        logger.info(f"Skipped (unchanged): {filename}")
+                        return True
+
+                    if expected_size is not None and expected_size < MAX_BUFFERED_SIZE:
+                        # Small image: buffer in memory and write it in one call
+                        body = response.read()
+                        if len(body) != expected_size:
+                            raise Exception(
+                                f"Incomplete download: expected {expected_size} bytes, got {len(body)} bytes"
+                            )
+                        temp_filepath.write_bytes(body)
+                    else:
+                        with open(temp_filepath, "wb") as f:
+                            for chunk in response.iter_bytes(chunk_size=262144):
+                                f.write(chunk)
+
+                        # Verify file size matches Content-Length if available
+                        if expected_size is not None:
+                            actual_size = temp_filepath.stat().st_size
+                            if actual_size != expected_size:
+                                temp_filepath.unlink()
+                                raise Exception(
+                                    f"Incomplete download: expected {expected_size} bytes, got {actual_size} bytes"
+                                )
 
                 # Move temp file to final location
                 temp_filepath.rename(filepath)
 
-                # Log URL and filename (thread-safe)
-                self.url_log.write(f"{filename}\t{url}\n")
-                self.url_log.flush()
+                # Log URL and filename
+                self._log_url(filename, url)
 
                 logger.info(f"Downloaded: {filename}")
                 return True
@@ -244,12 +352,8 @@ class SubwayTimetableDownloader:
     def process_bjsubway_station(self, station_url):
         """Process a single Beijing Subway station page"""
         try:
-            # Create a new session for this thread with proper configuration
-            session = self._create_session()
-
             # Get station page with timeout
-            response = session.get(station_url, timeout=30)
-            response.raise_for_status()
+            response = self._get_page(station_url)
             soup = BeautifulSoup(response.content, "html.parser")
 
             images_downloaded = 0
@@ -257,34 +361,22 @@ class SubwayTimetableDownloader:
             img_count = 0
             for img in soup.find_all("img"):
                 src = img.get("src", "")
-                if "/d/file/station/" in src and (".jpg" in src or ".png" in src):
-                    img_url = urljoin("https://www.bjsubway.com", src)
-
-                    # Extract station name from image filename
-                    filename_parts = src.split("/")[-1].split("-")
-                    if len(filename_parts) >= 2:
-                        line_name = (
-                            filename_parts[0].replace("号线", "").replace("线", "")
-                        )
-                        station_name = filename_parts[1]
-                        if station_name.endswith("站") and station_name not in [
-                            "朝阳站",
-                            "清河站",
-                            "丰台站",
-                            "北京站",
-                            "北京西站",
-                            "北京南站",
-                            "亦庄火车站",
-                        ]:
-                            station_name = station_name[:-1]
-                        img_count += 1
-
-                        filename = f"{line_name}-{station_name}-{img_count}.jpg"
-                        if self.download_image(img_url, filename):
-                            images_downloaded += 1
-
-            # Close the session to free up connections
-            session.close()
+                # Extract line and station name from image filename
+                match = IMG_NAME_RE.search(src)
+                if not match:
+                    continue
+                img_url = urljoin("https://www.bjsubway.com", src)
+
+                line_name = match.group(1).replace("号线", "").replace("线", "")
+                station_name = match.group(2)
+                if station_name.endswith("站") and station_name not in KEEP_ZHAN_STATIONS:
+                    station_name = station_name[:-1]
+                img_count += 1
+
+                filename = f"{line_name}-{station_name}-{img_count}.jpg"
+                if self.download_image(img_url, filename):
+                    images_downloaded += 1
+
             return f"Processed {station_url}: {images_downloaded} images downloaded"
 
         except Exception as e:
@@ -295,8 +387,9 @@ class SubwayTimetableDownloader:
 
         Args:
             line_filter: Specific line to download (e.g., "1", "6", "昌平")
-            force: If True, skip update date check and download anyway
+            force: If True, skip update date check and re-download existing images
         """
+        self._force = force
         if line_filter:
             logger.info(
                 f"Starting Beijing Subway (bjsubway.com) download for line {line_filter}..."
@@ -324,43 +417,40 @@ class SubwayTimetableDownloader:
                 logger.info(f"Skipping line {line_filter} (no update needed)")
                 return
 
+            # The line was revised (or never checked): existing images may be stale
+            self._force = True
+
         # Get main station list page
-        response = self.session.get("https://www.bjsubway.com/station/xltcx/")
+        response = self._get_page("https://www.bjsubway.com/station/xltcx/")
         soup = BeautifulSoup(response.content, "html.parser")
 
-        # Find all station links
-        station_links = []
+        # Find all station links (deduplicated, transfer stations appear on several lines)
+        station_links_set = set()
         for link in soup.find_all("a", href=True):
-            href = link["href"]
-            if "/station/xltcx/" in href and ".html" in href:
+            # Resolve to an absolute URL first so duplicates compare equal
+            station_url = urljoin("https://www.bjsubway.com", link["href"])
+            if "/station/xltcx/" in station_url and ".html" in station_url:
                 # If line filter is specified, check if URL matches
                 if line_filter:
                     # Extract line code from URL path like /line1/, /linecp/, or /lines7/
-                    line_match = re.search(r"/lines?([^/]+)/", href)
+                    line_match = re.search(r"/lines?([^/]+)/", station_url)
                     if line_match:
                         url_line_code = line_match.group(1)
 
                         # Check if it matches the filter
                         # For numeric lines, compare directly
+                        # Also support reverse lookup (e.g., user inputs "cp" for 昌平线)
                         if url_line_code == line_filter:
-                            station_links.append(
-                                urljoin("https://www.bjsubway.com", href)
-                            )
+                            station_links_set.add(station_url)
                         # For named lines, check if filter matches the code or the name
                         elif (
                             line_filter in line_code_map
                             and line_code_map[line_filter] == url_line_code
                         ):
-                            station_links.append(
-                                urljoin("https://www.bjsubway.com", href)
-                            )
-                        # Also support reverse lookup (e.g., user inputs "cp" for 昌平线)
-                        elif line_filter == url_line_code:
-                            station_links.append(
-                                urljoin("https://www.bjsubway.com", href)
-                            )
+                            station_links_set.add(station_url)
                 else:
-                    station_links.append(urljoin("https://www.bjsubway.com", href))
+                    station_links_set.add(station_url)
+        station_links = sorted(station_links_set)
 
         logger.info(f"Found {len(station_links)} station links")
 
@@ -368,8 +458,8 @@ class SubwayTimetableDownloader:
             logger.warning(f"No stations found for line {line_filter} on bjsubway.com")
             return
 
-        # Process stations concurrently with reduced workers to avoid connection pool issues
-        with ThreadPoolExecutor(max_workers=8) as executor:
+        # Process stations concurrently
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
             # Submit all tasks
             future_to_url = {
                 executor.submit(self.process_bjsubway_station, url): url
@@ -395,15 +485,11 @@ class SubwayTimetableDownloader:
         """Process a single MTR Beijing station page"""
         station_url, line_num = station_data
         try:
-            # Create a new session for this thread with proper configuration
-            session = self._create_session()
-
             # Add #schedule fragment to URL
             schedule_url = station_url + "#schedule"
 
             # Get station schedule page with timeout
-            response = session.get(schedule_url, timeout=30)
-            response.raise_for_status()
+            response = self._get_page(schedule_url)
             soup = BeautifulSoup(response.content, "html.parser")
 
             # Extract station name from page title or content
@@ -432,15 +518,14 @@ class SubwayTimetableDownloader:
                     if self.download_image(img_url, filename):
                         images_downloaded += 1
 
-            # Close the session to free up connections
-            session.close()
             return f"Processed {station_url}: {images_downloaded} images downloaded"
 
         except Exception as e:
             return f"Error processing {station_url}: {e}"
 
-    def download_mtr_beijing(self, line_filter=None):
+    def download_mtr_beijing(self, line_filter=None, force=False):
         """Download timetables from mtr.bj.cn with concurrent processing"""
+        self._force = force
         if line_filter:
             logger.info(f"Starting MTR Beijing download for line {line_filter}...")
         else:
@@ -465,14 +550,14 @@ class SubwayTimetableDownloader:
                 )
                 return
 
-        all_station_data = []
+        all_station_data = set()
 
         # Collect all station data first
         for line_num in lines:
             logger.info(f"Collecting stations for MTR Line {line_num}")
 
             # Get line page
-            response = self.session.get(
+            response = self._get_page(
                 f"https://www.mtr.bj.cn/service/line/line-{line_num}.html"
             )
             soup = BeautifulSoup(response.content, "html.parser")
@@ -482,12 +567,13 @@ class SubwayTimetableDownloader:
                 href = link["href"]
                 if "/service/line/station/" in href:
                     station_url = urljoin("https://www.mtr.bj.cn", href)
-                    all_station_data.append((station_url, line_num))
+                    all_station_data.add((station_url, line_num))
+        all_station_data = sorted(all_station_data)
 
         logger.info(f"Found {len(all_station_data)} total MTR stations")
 
-        # Process all stations concurrently with reduced workers to avoid connection pool issues
-        with ThreadPoolExecutor(max_workers=8) as executor:
+        # Process all stations concurrently
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
             # Submit all tasks
             future_to_data = {
                 executor.submit(self.process_mtr_station, data): data
@@ -518,8 +604,9 @@ class SubwayTimetableDownloader:
         except Exception as e:
             return f"Error downloading {filename}: {e}"
 
-    def download_bjmoa(self, line_filter=None):
+    def download_bjmoa(self, line_filter=None, force=False):
         """Download timetables from bjmoa.cn with concurrent processing"""
+        self._force = force
         if line_filter:
             logger.info(
                 f"Starting Beijing Rail Operations download for line {line_filter}..."
@@ -554,7 +641,7 @@ class SubwayTimetableDownloader:
 
             try:
                 # Get line page
-                response = self.session.get(
+                response = self._get_page(
                     f"https://www.bjmoa.cn/trainTimeList_363.html?sline={line_id}"
                 )
                 soup = BeautifulSoup(response.content, "html.parser")
@@ -598,8 +685,8 @@ class SubwayTimetableDownloader:
 
         logger.info(f"Found {len(all_image_data)} total BJMOA images")
 
-        # Process all images concurrently with reduced workers to avoid connection pool issues
-        with ThreadPoolExecutor(max_workers=8) as executor:
+        # Process all images concurrently
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
             # Submit all tasks
             future_to_data = {
                 executor.submit(self.process_bjmoa_image, data): data
@@ -624,7 +711,7 @@ class SubwayTimetableDownloader:
 
         Args:
             line_filter: Specific line to download
-            force: If True, skip update date check and download anyway
+            force: If True, skip update date check and re-download existing images
         """
         if line_filter:
             logger.info(f"Starting timetable download for line {line_filter}...")
@@ -637,24 +724,19 @@ class SubwayTimetableDownloader:
             logger.error(f"BJSubway download failed: {e}")
 
         try:
-            self.download_mtr_beijing(line_filter)
+            self.download_mtr_beijing(line_filter, force=force)
         except Exception as e:
             logger.error(f"MTR Beijing download failed: {e}")
 
         try:
-            self.download_bjmoa(line_filter)
+            self.download_bjmoa(line_filter, force=force)
         except Exception as e:
             logger.error(f"BJMOA download failed: {e}")
 
         # Close URL log file
-        self.url_log.close()
+        self.close()
         logger.info(f"Download complete! URLs logged to {self.url_log_file}")
 
-    def __del__(self):
-        """Cleanup: ensure URL log file is closed"""
-        if hasattr(self, "url_log") and not self.url_log.closed:
-            self.url_log.close()
-
 
 def main():
     parser = argparse.ArgumentParser(
@@ -692,13 +774,14 @@ Sources:
         "-f",
         "--force",
         action="store_true",
-        help="Force download even if update date hasn't changed (for Beijing Subway only)",
+        help="Force download even if update date hasn't changed or the image already exists",
     )
 
     args = parser.parse_args()
 
-    downloader = SubwayTimetableDownloader(output_dir=args.output)
-    downloader.download_all(line_filter=args.line, force=args.force)
+    install_dns_cache()
+    with SubwayTimetableDownloader(output_dir=args.output) as downloader:
+        downloader.download_all(line_filter=args.line, force=args.force)
 
 
 if __name__ == "__main__":
@@ -5,9 +5,19 @@
 使用Overpass API查询OpenStreetMap数据库中的地铁站点信息
 """
 
+import argparse
 import requests
 import json
 import re
+import hashlib
+import time
+from pathlib import Path
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+PAREN_RE = re.compile(r"\([^)]*\)")
+FULLWIDTH_PAREN_RE = re.compile(r"（[^）]*）")
+LINE_NAME_RE = re.compile(r"\s+(.+?)号?线")
 
 
 def clean_station_name(name):
@@ -15,9 +25,9 @@ def clean_station_name(name):
     if not name:
         return name
     # 去掉括号及其中内容
-    cleaned = re.sub(r"\([^)]*\)", "", name)
+    cleaned = PAREN_RE.sub("", name)
     # 去掉其他可能的括号类型
-    cleaned = re.sub(r"（[^）]*）", "", cleaned)
+    cleaned = FULLWIDTH_PAREN_RE.sub("", cleaned)
     # 去掉首尾空格
     return cleaned.strip()
 
@@ -27,119 +37,153 @@ def clean_line_name(name: str) -> str:
     if not name:
         return name
 
-    space_match = re.search(r"\s+(.+?)号?线", name)
+    space_match = LINE_NAME_RE.search(name)
     if space_match:
         return space_match.group(1)
 
 
-def fetch_beijing_subway_from_osm():
-    """从OpenStreetMap获取北京地铁站点数据"""
-
-    # Overpass API endpoint
-    overpass_url = "https://overpass-api.de/api/interpreter"
+OVERPASS_URL = "https://overpass-api.de/api/interpreter"
 
-    # 查询所有北京地区的地铁站点
-    # 使用边界框限定北京地区：纬度39.5-40.5，经度116.0-117.0
-    overpass_query = """
-    [out:json][timeout:30][bbox:39.5,116.0,40.5,117.0];
-    (
-      node["railway"="station"]["station"="subway"];
-      node["public_transport"="stop_position"]["subway"="yes"];
-      node["railway"="station"]["network"~"北京|Beijing"];
-    );
-    out body;
-    """
+# 一次查询同时获取地铁站点和线路，避免对 Overpass API 的重复请求
+# 站点使用边界框限定北京地区：纬度39.5-40.5，经度116.0-117.0
+OVERPASS_QUERY = """
+[out:json][timeout:60];
+(
+  node["railway"="station"]["station"="subway"](39.5,116.0,40.5,117.0);
+  node["public_transport"="stop_position"]["subway"="yes"](39.5,116.0,40.5,117.0);
+  node["railway"="station"]["network"~"北京|Beijing"](39.5,116.0,40.5,117.0);
+  relation["type"="route"]["route"="subway"]["network"~"北京|Beijing"];
+);
+out body;
+"""
 
-    try:
-        response = requests.get(overpass_url, params={"data": overpass_query})
-        response.raise_for_status()
-        data = response.json()
+# 原始查询结果缓存，按查询语句的 SHA256 区分，超过有效期后重新获取
+CACHE_FILE = Path(".osm_cache.json")
+CACHE_TTL = 24 * 60 * 60  # 秒
 
-        stations = {}
 
-        for element in data.get("elements", []):
-            if element.get("type") == "node":
-                tags = element.get("tags", {})
-                station_name = tags.get("name") or tags.get("name:zh")
+def create_session():
+    """创建带重试和退避策略的会话"""
+    session = requests.Session()
+    retry_strategy = Retry(
+        total=5,
+        backoff_factor=1.5,
+        status_forcelist=[429, 502, 503, 504],
+        allowed_methods=["GET"],
+    )
+    adapter = HTTPAdapter(max_retries=retry_strategy)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
 
-                if station_name:
-                    lat = element.get("lat")
-                    lon = element.get("lon")
 
-                    if lat and lon:
-                        # 清理站点名称
-                        cleaned_name = clean_station_name(station_name)
-                        if cleaned_name and cleaned_name not in stations:
-                            stations[cleaned_name] = [lat, lon]
-                            print(f"找到站点: {cleaned_name} ({lat}, {lon})")
+def fetch_osm_elements(refresh=False):
+    """从OpenStreetMap获取北京地铁站点和线路数据，未过期时使用本地缓存
 
-        return stations
+    refresh 为 True 时忽略缓存，直接请求 Overpass API
+    """
+    query_hash = hashlib.sha256(OVERPASS_QUERY.encode("utf-8")).hexdigest()
+
+    if not refresh and CACHE_FILE.exists():
+        try:
+            with open(CACHE_FILE, "r", encoding="utf-8") as f:
+                cache = json.load(f)
+            age = time.time() - cache.get("fetched_at", 0)
+            if cache.get("query_hash") == query_hash and age < CACHE_TTL:
+                print(f"使用缓存数据: {CACHE_FILE}（{age / 3600:.1f} 小时前获取）")
+                return cache["data"].get("elements", [])
+        except (json.JSONDecodeError, KeyError) as e:
+            print(f"缓存读取失败: {e}")
 
+    try:
+        with create_session() as session:
+            response = session.get(OVERPASS_URL, params={"data": OVERPASS_QUERY})
+            response.raise_for_status()
+            data = response.json()
     except requests.exceptions.RequestException as e:
         print(f"请求失败: {e}")
-        return {}
+        return []
     except json.JSONDecodeError as e:
         print(f"JSON解析失败: {e}")
-        return {}
-
-
-def fetch_subway_lines_from_osm():
-    """获取北京地铁线路信息"""
+        return []
 
-    overpass_url = "https://overpass-api.de/api/interpreter"
+    elements = data.get("elements", [])
 
-    # 查询地铁线路
-    overpass_query = """
-    [out:json][timeout:30];
-    (
-      relation["type"="route"]["route"="subway"]["network"~"北京|Beijing"];
-    );
-    out body;
-    """
+    # 超时或运行错误时 Overpass 仍返回 200，只在 remark 中说明，结果可能不完整
+    if "remark" in data or not elements:
+        print(f"查询结果不完整，不写入缓存: {data.get('remark', '无数据')}")
+        return elements
 
     try:
-        response = requests.get(overpass_url, params={"data": overpass_query})
-        response.raise_for_status()
-        data = response.json()
-
-        lines = []
-        seen_lines = set()
-
-        for element in data.get("elements", []):
-            if element.get("type") == "relation":
-                tags = element.get("tags", {})
-                line_name = tags.get("name") or tags.get("ref")
-                line_color = tags.get("colour")
-
-                if line_name:
-                    # 清理线路名称
-                    cleaned_name = clean_line_name(line_name)
-                    if cleaned_name and cleaned_name not in seen_lines:
-                        line_info = {"lineName": cleaned_name, "lineColor": line_color}
-                        lines.append(line_info)
-                        seen_lines.add(cleaned_name)
-                        print(
-                            f"找到线路: {cleaned_name} (原名: {line_name}, 颜色: {line_color})"
-                        )
-        lines.sort(key=lambda x: x["lineName"])  # 按线路名称排序
-        return lines
-
-    except requests.exceptions.RequestException as e:
-        print(f"请求失败: {e}")
-        return []
+        with open(CACHE_FILE, "w", encoding="utf-8") as f:
+            json.dump(
+                {"query_hash": query_hash, "fetched_at": time.time(), "data": data},
+                f,
+                ensure_ascii=False,
+            )
+    except OSError as e:
+        print(f"缓存写入失败: {e}")
+
+    return elements
+
+
+def parse_osm_elements(elements):
+    """解析查询结果，返回站点坐标和线路信息"""
+    stations = {}
+    lines = []
+    seen_lines = set()
+
+    for element in elements:
+        element_type = element.get("type")
+        tags = element.get("tags", {})
+
+        if element_type == "node":
+            station_name = tags.get("name") or tags.get("name:zh")
+
+            if station_name:
+                lat = element.get("lat")
+                lon = element.get("lon")
+
+                if lat and lon:
+                    # 清理站点名称
+                    cleaned_name = clean_station_name(station_name)
+                    if cleaned_name and cleaned_name not in stations:
+                        stations[cleaned_name] = [lat, lon]
+                        print(f"找到站点: {cleaned_name} ({lat}, {lon})")
+
+        elif element_type == "relation":
+            line_name = tags.get("name") or tags.get("ref")
+            line_color = tags.get("colour")
+
+            if line_name:
+                # 清理线路名称
+                cleaned_name = clean_line_name(line_name)
+                if cleaned_name and cleaned_name not in seen_lines:
+                    line_info = {"lineName": cleaned_name, "lineColor": line_color}
+                    lines.append(line_info)
+                    seen_lines.add(cleaned_name)
+                    print(
+                        f"找到线路: {cleaned_name} (原名: {line_name}, 颜色: {line_color})"
+                    )
+
+    lines.sort(key=lambda x: x["lineName"])  # 按线路名称排序
+    return stations, lines
 
 
 def main():
     """主函数"""
-    print("从OpenStreetMap获取北京地铁数据...")
+    parser = argparse.ArgumentParser(description="从OpenStreetMap获取北京地铁站点和线路数据")
+    parser.add_argument(
+        "--refresh", action="store_true", help="忽略本地缓存，重新请求 Overpass API"
+    )
+    args = parser.parse_args()
 
-    # 获取地铁站点
-    print("\n=== 获取地铁站点 ===")
-    stations = fetch_beijing_subway_from_osm()
+    print("从OpenStreetMap获取北京地铁数据...")
 
-    # 获取地铁线路
-    print("\n=== 获取地铁线路 ===")
-    lines = fetch_subway_lines_from_osm()
+    # 获取地铁站点和线路
+    print("\n=== 获取地铁站点和线路 ===")
+    elements = fetch_osm_elements(refresh=args.refresh)
+    stations, lines = parse_osm_elements(elements)
 
     # 组织数据格式
     osm_data = {"lines": lines, "coordinates": stations}
@@ -6,14 +6,126 @@ Parse train timetable images using OCR to extract schedules.
 import os
 import re
 import json
+import hashlib
+import sqlite3
 from pathlib import Path
-from typing import List, Tuple, Dict, Optional
+from typing import List, Tuple, Dict, Optional, Sequence
 from concurrent.futures import ProcessPoolExecutor, as_completed
 import numpy as np
 from ocrmac import ocrmac
 from PIL import Image
-from thefuzz import fuzz
-from functools import partial
+from rapidfuzz import fuzz, process
+from functools import partial, lru_cache
+
+# "开往XXX方向", tolerating common OCR misreads of 开/往
+DEST_RE = re.compile(r"[开牙去][往住注]?(.+?)站?(方向|To)")
+ALNUM_RE = re.compile(r"[a-zA-Z0-9]+")
+
+# Vertical Line 18 labels may be read bottom-to-top, so match both orientations at once:
+# groups 1-2 are "开往XXX方向" read normally, group 3 is XXX when read reversed
+DEST_DUAL_RE = re.compile(
+    r"[开牙去][往住注]?(.+?)站?(方向|To)|(?:向方|oT)站?(.+?)[往住注]?[开牙去]"
+)
+
+# Line 18 operating time keywords in priority order, with their reversed spellings
+LINE18_OPERATING_TIMES = [
+    ("工作日", ("工作日", "作日")),
+    ("双休日", ("双休日", "休日")),
+    ("平日", ("平日",)),
+]
+LINE18_KEYWORDS = {
+    keyword[::-1] if reverse else keyword: (operating_time, reverse)
+    for operating_time, keywords in LINE18_OPERATING_TIMES
+    for keyword in keywords
+    for reverse in (False, True)
+}
+# Lookahead so overlapping keywords are all found
+LINE18_KEYWORD_RE = re.compile("(?=(" + "|".join(LINE18_KEYWORDS) + "))")
+
+# Timetable image file extensions (compared lowercased)
+IMAGE_EXTENSIONS = frozenset({".jpg", ".jpeg", ".png"})
+
+# Number of parsed images between flushes of the JSONL output
+JSONL_FLUSH_INTERVAL = 16
+
+# On-disk cache of OCR results, keyed by image content, so reruns skip OCR
+OCR_CACHE_FILE = "_ocr_cache.sqlite"
+_ocr_cache_conn = None
+
+# Hour prefixes of schedule lines
+SINGLE_DIGIT_HOURS = frozenset("456789")
+TWO_DIGIT_HOURS = frozenset(f"{x:02d}" for x in range(5, 25)) | {"00"}
+# The first schedule line of the day starts at 4-7 o'clock
+FIRST_SINGLE_DIGIT_HOURS = frozenset("4567")
+FIRST_TWO_DIGIT_HOURS = frozenset(["04", "05", "06", "07"])
+
+# OCR sometimes reads minutes as circled digits
+CIRCLE_NUMBER_TABLE = str.maketrans("①②③④⑤⑥⑦⑧⑨", "123456789")
+
+
+def ocr_cache_key(image: Image.Image) -> str:
+    """Cache key for OCR results: hash of the exact pixels sent to OCR"""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{image.mode}-{image.size[0]}x{image.size[1]}".encode())
+    digest.update(image.tobytes())
+    return digest.hexdigest()
+
+
+def _get_ocr_cache() -> sqlite3.Connection:
+    """Open the OCR cache database on first use"""
+    global _ocr_cache_conn
+    if _ocr_cache_conn is None:
+        # Worker processes share the file; wait for each other's short writes
+        _ocr_cache_conn = sqlite3.connect(OCR_CACHE_FILE, timeout=30)
+        _ocr_cache_conn.execute(
+            "CREATE TABLE IF NOT EXISTS ocr (hash TEXT PRIMARY KEY, annotations TEXT)"
+        )
+    return _ocr_cache_conn
+
+
+def recognize_text(image: Image.Image, annotation_path: Optional[str] = None) -> List[Tuple]:
+    """
+    Perform OCR on an image, reusing cached results when available.
+
+    Args:
+        image: Image to recognize
+        annotation_path: If set, save an annotated copy of the image here (always runs OCR)
+
+    Returns:
+        List of (text, confidence, bbox) annotations
+    """
+    cache_key = ocr_cache_key(image)
+    if not annotation_path:
+        row = _get_ocr_cache().execute(
+            "SELECT annotations FROM ocr WHERE hash = ?", (cache_key,)
+        ).fetchone()
+        if row:
+            return json.loads(row[0])
+
+    ocr = ocrmac.OCR(image, framework="livetext")
+    annotations = ocr.recognize()
+    if annotation_path:
+        ocr.annotate_PIL().save(annotation_path)
+
+    conn = _get_ocr_cache()
+    conn.execute(
+        "INSERT OR REPLACE INTO ocr (hash, annotations) VALUES (?, ?)",
+        (cache_key, json.dumps(annotations, ensure_ascii=False)),
+    )
+    conn.commit()
+    return annotations
+
+
+def print_schedule(header: str, schedule_times: List[str]):
+    """Print schedule times grouped by hour, as one block"""
+    minutes = {}
+    for time in schedule_times:
+        minutes.setdefault(int(time[:2]), []).append(int(time[3:5]))
+    lines = [header]
+    # schedule_times is already sorted, so hours are in order
+    for hour, mins in minutes.items():
+        lines.append(f"{hour:02}:" + "".join(f" {minute:02}" for minute in mins))
+    print("\n".join(lines))
 
 
 def group_text_by_lines(annotations: List[Tuple], eps: float = 2e-2) -> List[List[str]]:
@@ -67,7 +179,7 @@ def extract_destination(lines: List[List[str]]) -> Optional[str]:
     """
     for line in lines:
         line_text = "".join(line)
-        match = re.search(r"[开牙去][往住注]?(.+?)站?(方向|To)", line_text)
+        match = DEST_RE.search(line_text)
         if match:
             return match.group(1).strip()
     return None
@@ -92,19 +204,6 @@ def extract_operating_time(lines: List[List[str]]) -> Optional[str]:
     return None
 
 
-def replace_circle_number(s: str) -> str:
-    s = s.replace("①", "1")
-    s = s.replace("②", "2")
-    s = s.replace("③", "3")
-    s = s.replace("④", "4")
-    s = s.replace("⑤", "5")
-    s = s.replace("⑥", "6")
-    s = s.replace("⑦", "7")
-    s = s.replace("⑧", "8")
-    s = s.replace("⑨", "9")
-    return s
-
-
 def extract_schedule_times(lines: List[List[str]]) -> List[str]:
     """
     Extract schedule times from lines starting with hours 4-23
@@ -113,11 +212,8 @@ def extract_schedule_times(lines: List[List[str]]) -> List[str]:
 
     last_hour = None
     for line in lines:
-        line_text = ""
-        for c in line:
-            c = replace_circle_number(c)
-            if c.isnumeric():
-                line_text += c
+        tokens = (c.translate(CIRCLE_NUMBER_TABLE) for c in line)
+        line_text = "".join(c for c in tokens if c.isnumeric())
 
         if not line_text:
             continue
@@ -127,35 +223,35 @@ def extract_schedule_times(lines: List[List[str]]) -> List[str]:
             if not line[0].isnumeric() or "表" in line or line_text == "520":
                 continue  # skip footer
             if last_hour is None and not (
-                line_text[0] in "4567" or line_text[0:2] in ["04", "05", "06", "07"]
+                line_text[0] in FIRST_SINGLE_DIGIT_HOURS
+                or line_text[0:2] in FIRST_TWO_DIGIT_HOURS
             ):
                 continue
-            if line_text[0] in "456789":
+            if line_text[0] in SINGLE_DIGIT_HOURS:
                 hour = int(line_text[0])
-                line_text = line_text[1:]  # Remove hour from text
-            elif line_text[0:2] in [f"{x:02d}" for x in range(5, 25)] + ["00"]:
+                start = 1  # Skip hour
+            elif line_text[0:2] in TWO_DIGIT_HOURS:
                 hour = int(line_text[0:2])
-                line_text = line_text[2:]  # Remove hour from text
+                start = 2  # Skip hour
             else:
                 continue
             last_hour = hour
 
-            # Process remaining numbers as minutes
-            while len(line_text) >= 2:
+            # Process remaining numbers as two-digit minutes in one pass
+            for j in range(start, len(line_text) - 1, 2):
                 try:
-                    minute = int(line_text[0:2])
-                    if 0 <= minute <= 59:  # Valid minute
-                        schedule_times.append(f"{hour:02d}:{minute:02d}")
+                    minute = int(line_text[j:j + 2])
                 except ValueError:
                     continue
-                finally:
-                    line_text = line_text[2:]  # Remove processed minute
+                if 0 <= minute <= 59:  # Valid minute
+                    schedule_times.append((hour, minute))
 
         except ValueError:
             continue
 
-    schedule_times.sort(key=lambda x: x.replace("00:", "24:"))
-    return schedule_times
+    # Midnight trains run after 23:xx
+    schedule_times.sort(key=lambda t: (24 if t[0] == 0 else t[0], t[1]))
+    return [f"{hour:02d}:{minute:02d}" for hour, minute in schedule_times]
 
 
 THRESHOLDS = {
@@ -215,21 +311,31 @@ def convert_and_binarize_image(
         else:
             images = [img]
 
+        binary_lut = [255 if i > threshold else 0 for i in range(256)]
         processed_images = []
         for image in images:
             # Keep grayscale version
             grayscale_img = image.copy()
 
-            # Create binary version
-            img_array = np.array(image)
-            binary_array = (img_array > threshold).astype(np.uint8) * 255
-            binary_img = Image.fromarray(binary_array, mode="L")
+            # Create binary version with a lookup table, in one pass inside Pillow
+            binary_img = image.point(binary_lut)
 
             processed_images.append((grayscale_img, binary_img))
 
         return processed_images
 
 
+def list_image_files(directory: Path) -> List[Path]:
+    """Timetable images in directory, sorted by path, found in a single directory scan"""
+    with os.scandir(directory) as entries:
+        image_paths = sorted(
+            entry.path
+            for entry in entries
+            if entry.is_file() and os.path.splitext(entry.name)[1].lower() in IMAGE_EXTENSIONS
+        )
+    return [Path(path) for path in image_paths]
+
+
 def extract_route_and_station(filename: str) -> Tuple[Optional[str], Optional[str]]:
     """
     Extract route and station from filename pattern "线路-站名-*.<扩展名>"
@@ -237,8 +343,8 @@ def extract_route_and_station(filename: str) -> Tuple[Optional[str], Optional[st
     # Remove file extension
     basename = os.path.splitext(os.path.basename(filename))[0]
 
-    # Split by '-' and take first two parts
-    parts = basename.split("-")
+    # Split by '-' and take first two parts; the rest is never needed
+    parts = basename.split("-", 2)
 
     if len(parts) >= 2:
         route = parts[0]
@@ -248,25 +354,57 @@ def extract_route_and_station(filename: str) -> Tuple[Optional[str], Optional[st
     return None, None
 
 
-def parse_station_names_from_files(image_files: List[Path]) -> Dict[str, List[str]]:
-    """Parse station names from image files and group by route"""
-    route_stations = {"首都机场": ["首都机场"], "1": ["环球度假区"], "八通": ["古城"]}
+def parse_station_names_from_files(image_files: List[Path]) -> Dict[str, Tuple[str, ...]]:
+    """
+    Parse station names from image files and group by route.
+    Stations are returned as tuples so they can be used as cache keys.
+    """
+    # Dicts keep insertion order and deduplicate stations
+    route_stations = {"首都机场": {"首都机场": None}, "1": {"环球度假区": None}, "八通": {"古城": None}}
 
     for image_path in image_files:
-        route, station = extract_route_and_station(str(image_path))
+        # Only the file name is parsed, so this stays cheap even for thousands of files
+        route, station = extract_route_and_station(os.fspath(image_path))
         if route and station:
-            if route not in route_stations:
-                route_stations[route] = []
-            if station not in route_stations[route]:
-                route_stations[route].append(station)
+            route_stations.setdefault(route, {})[station] = None
+
+    return {route: tuple(stations) for route, stations in route_stations.items()}
 
-    return route_stations
+
+def match_stations(destinations: Sequence[str], stations: Tuple[str, ...]) -> List[str]:
+    """
+    Find the station closest to each destination.
+
+    Destinations that are already station names are kept, the rest are scored
+    against all stations in one rapidfuzz.cdist call. A destination with no
+    similarity to any station is returned unchanged.
+    """
+    matches = list(destinations)
+    # Fast path: OCR is usually right
+    misses = [i for i, destination in enumerate(destinations) if destination not in stations]
+    if not misses:
+        return matches
+
+    scores = process.cdist(
+        [destinations[i] for i in misses], stations, scorer=fuzz.ratio, processor=None
+    )
+    # argmax picks the first of equally good stations
+    for i, row, best in zip(misses, scores, scores.argmax(axis=1)):
+        if row[best] > 0:
+            matches[i] = stations[best]
+    return matches
+
+
+@lru_cache(maxsize=8192)
+def find_best_match(destination: str, stations: Tuple[str, ...]) -> str:
+    """Find the station closest to destination; OCR typos recur across images"""
+    return match_stations((destination,), stations)[0]
 
 
 def auto_correct_destination(
     destination: str,
     route: str,
-    route_stations: Dict[str, List[str]],
+    route_stations: Dict[str, Tuple[str, ...]],
 ) -> str:
     """Auto-correct destination name to the closest station in the same route"""
     if not destination or not route or route not in route_stations:
@@ -276,22 +414,22 @@ def auto_correct_destination(
     if not station_list:
         return destination
 
-    # Normal processing for other routes
-    # Check for exact match first
-    if destination in station_list:
-        return destination
+    # Find the best match (closest station), exact matches included, so repeated
+    # lookups are answered by the cache instead of scanning the station list
+    return find_best_match(destination, station_list)
 
-    # Find the best match (closest station)
-    best_match = destination
-    best_score = 0
 
-    for station in station_list:
-        score = fuzz.ratio(destination, station)
-        if score > best_score:
-            best_score = score
-            best_match = station
+def auto_correct_destinations(
+    destinations: Sequence[str],
+    route: str,
+    route_stations: Dict[str, Tuple[str, ...]],
+) -> List[str]:
+    """Auto-correct many destination names of one route at once, like auto_correct_destination"""
+    station_list = route_stations.get(route) if route else None
+    if not station_list:
+        return list(destinations)
 
-    return best_match
+    return match_stations(destinations, station_list)
 
 
 def group_text_by_columns(annotations: List[Tuple], eps: float = 0.05) -> List[List[str]]:
@@ -344,12 +482,71 @@ def group_text_by_columns(annotations: List[Tuple], eps: float = 0.05) -> List[L
     return columns
 
 
+def extract_line18_labels(columns: List[List[str]]) -> Tuple[List[str], List[str]]:
+    """
+    Extract all destinations and operating_times from vertical text columns.
+    Line 18 format has TWO timetables side-by-side, each with its own destination/operating_time
+    """
+    destinations = []
+    operating_times = []
+
+    for column in columns:
+        column_text = "".join(column)
+
+        # Remove numbers and English to clean up the text for matching
+        clean_text = ALNUM_RE.sub('', column_text)
+
+        # Extract destination, in either reading direction
+        for match in DEST_DUAL_RE.finditer(clean_text):
+            if match.group(1) is not None:
+                dest = match.group(1).strip()
+            else:
+                dest = match.group(3)[::-1].strip()
+            if dest and dest not in destinations:
+                destinations.append(dest)
+                print(f"  -> Found destination: '{dest}'")
+
+        # Extract operating_time - collect keywords found per reading direction
+        found = ({"平日"} if "Ordinary" in column_text else set(),
+                 {"平日"} if "yranidrO" in column_text else set())
+        for match in LINE18_KEYWORD_RE.finditer(clean_text):
+            operating_time, reverse = LINE18_KEYWORDS[match.group(1)]
+            found[reverse].add(operating_time)
+
+        # Per direction, only the highest priority keyword counts
+        for found_times in found:
+            for operating_time, _ in LINE18_OPERATING_TIMES:
+                if operating_time in found_times:
+                    if operating_time not in operating_times:
+                        operating_times.append(operating_time)
+                        print(f"  -> Found operating_time: '{operating_time}'")
+                    break
+
+    return destinations, operating_times
+
+
+def find_weekend_marker_x(annotations: List[Tuple]) -> Optional[float]:
+    """
+    Find the x-coordinate of the rightmost weekend marker ("休" in "双休日", or "Weekends").
+    Used to split Line 18 timetables into left and right sides.
+    """
+    weekend_x_positions = []
+    for text, _conf, bbox in annotations:
+        clean = ALNUM_RE.sub('', text)
+        if "双休日" in clean or "休日" in clean or "休" in clean or "Weekends" in text:
+            weekend_x_positions.append(bbox[0])
+
+    # Use the rightmost "休" (in case there are multiple)
+    return max(weekend_x_positions) if weekend_x_positions else None
+
+
 def parse_line18_format(
     grayscale_img: Image.Image,
     binary_img: Image.Image,
     image_path: str,
-    route_stations: Dict[str, List[str]],
-    suffix: str = ""
+    route_stations: Dict[str, Tuple[str, ...]],
+    suffix: str = "",
+    annotate: bool = False,
 ) -> List[Dict]:
     """
     Special parser for Line 18 timetables where:
@@ -358,53 +555,33 @@ def parse_line18_format(
 
     Returns list of 2 results (left side and right side)
     """
-    os.makedirs("annotations", exist_ok=True)
-
     annotation_path_gray = f"annotations/{Path(image_path).stem}{suffix}_gray.png"
     annotation_path_binary = f"annotations/{Path(image_path).stem}{suffix}_binary.png"
 
-    # Perform OCR on grayscale
-    ocr_gray = ocrmac.OCR(grayscale_img, framework="livetext")
-    annotations_gray = ocr_gray.recognize()
-    ocr_gray.annotate_PIL().save(annotation_path_gray)
-
-    # Group all text by vertical columns
-    columns_gray = group_text_by_columns(annotations_gray)
-
-    # Extract all destinations and operating_times from columns
-    # Line 18 format has TWO timetables side-by-side, each with its own destination/operating_time
-    destinations = []
-    operating_times = []
-
-    for column in columns_gray:
-        column_text = "".join(column)
-
-        # For vertical text, OCR may read bottom-to-top, so try both directions
-        for text in [column_text, column_text[::-1]]:
-            # Remove numbers and English to clean up the text for matching
-            clean_text = re.sub(r'[a-zA-Z0-9]+', '', text)
-
-            # Extract destination
-            match = re.search(r"[开牙去][往住注]?(.+?)站?(方向|To)", clean_text)
-            if match:
-                dest = match.group(1).strip()
-                if dest and dest not in destinations:
-                    destinations.append(dest)
-                    print(f"  -> Found destination: '{dest}'")
-
-            # Extract operating_time - check for the keywords in cleaned text
-            if "工作日" in clean_text or "作日" in clean_text:
-                if "工作日" not in operating_times:
-                    operating_times.append("工作日")
-                    print(f"  -> Found operating_time: '工作日'")
-            elif "双休日" in clean_text or "休日" in clean_text:
-                if "双休日" not in operating_times:
-                    operating_times.append("双休日")
-                    print(f"  -> Found operating_time: '双休日'")
-            elif "平日" in clean_text or "Ordinary" in text:
-                if "平日" not in operating_times:
-                    operating_times.append("平日")
-                    print(f"  -> Found operating_time: '平日'")
+    # Perform OCR on binary image for schedule_times
+    annotations_binary = recognize_text(
+        binary_img,
+        annotation_path=annotation_path_binary if annotate else None,
+    )
+
+    # The vertical labels are usually legible in the binary image as well,
+    # so only run grayscale OCR if something is missing
+    destinations, operating_times = extract_line18_labels(
+        group_text_by_columns(annotations_binary)
+    )
+    weekend_x = find_weekend_marker_x(annotations_binary)
+
+    if len(destinations) < 2 or not operating_times or weekend_x is None:
+        # Perform OCR on grayscale
+        annotations_gray = recognize_text(
+            grayscale_img,
+            annotation_path=annotation_path_gray if annotate else None,
+        )
+
+        destinations, operating_times = extract_line18_labels(
+            group_text_by_columns(annotations_gray)
+        )
+        weekend_x = find_weekend_marker_x(annotations_gray)
 
     # For Line 18, we expect 2 destinations and 2 operating_times (one for each side)
     # If we only found one destination, duplicate it
@@ -447,28 +624,13 @@ def parse_line18_format(
                 print(f"Auto-correct: '{right_destination}' -> '{corrected}'")
             right_destination = corrected
 
-    # Perform OCR on binary image for schedule_times
-    ocr_binary = ocrmac.OCR(binary_img, framework="livetext")
-    annotations_binary = ocr_binary.recognize()
-    ocr_binary.annotate_PIL().save(annotation_path_binary)
-
-    # Find split point using the x-coordinate of "双休日" or "Weekends" text from grayscale OCR
+    # Find split point using the x-coordinate of "双休日" or "Weekends" text
     # This is more reliable than trying to find gaps
-    split_point = 0.5  # Default
-
-    # Look for weekend marker in grayscale annotations
-    # Check for "休" character which appears in "双休日"
-    weekend_x_positions = []
-    for text, _conf, bbox in annotations_gray:
-        clean = re.sub(r'[a-zA-Z0-9]+', '', text)
-        if "双休日" in clean or "休日" in clean or "休" in clean or "Weekends" in text:
-            weekend_x_positions.append(bbox[0])
-
-    # Use the rightmost "休" as the split point (in case there are multiple)
-    if weekend_x_positions:
-        split_point = max(weekend_x_positions)
+    if weekend_x is not None:
+        split_point = weekend_x
         print(f"  Using split point at x={split_point:.4f} (from '休' position)")
     else:
+        split_point = 0.5  # Default
         print(f"  Using default split at x=0.5")
 
     # Split binary annotations by left/right using the detected split point
@@ -489,16 +651,10 @@ def parse_line18_format(
         ("左", left_destination, left_operating_time, left_times),
         ("右", right_destination, right_operating_time, right_times)
     ]:
-        print(f"线路-{route}, 站名-{station}, 开往-{destination}, 时段-{operating_time} ({side_name})")
-        minutes = {}
-        for time in schedule_times:
-            hour, minute = map(int, time.split(":"))
-            minutes[hour] = minutes.get(hour, []) + [minute]
-        for hour, mins in sorted(minutes.items(), key=lambda x: 24 if x[0] == 0 else x[0]):
-            print(f"{hour:02}:", end="")
-            for minute in mins:
-                print(f" {minute:02}", end="")
-            print()
+        print_schedule(
+            f"线路-{route}, 站名-{station}, 开往-{destination}, 时段-{operating_time} ({side_name})",
+            schedule_times,
+        )
 
         result = {
             "filename": os.path.basename(image_path) + suffix,
@@ -514,11 +670,12 @@ def parse_line18_format(
 
 
 def parse_timetable_image(
-    image_path: str, route_stations: Dict[str, List[str]] = None
+    image_path: str, route_stations: Dict[str, Tuple[str, ...]] = None, annotate: bool = False
 ) -> List[Dict]:
     """
     Parse a single timetable image and extract all information
     Returns list of results (multiple if image was split)
+    If annotate is set, OCR annotation images are saved to annotations/ for debugging
     """
     try:
         # Check if this is Line 18 (special format)
@@ -528,7 +685,8 @@ def parse_timetable_image(
         # Convert and binarize image for better OCR (may return multiple images if split)
         image_pairs = convert_and_binarize_image(image_path)
 
-        os.makedirs("annotations", exist_ok=True)
+        if annotate:
+            os.makedirs("annotations", exist_ok=True)
         results = []
 
         for i, (grayscale_img, binary_img) in enumerate(image_pairs):
@@ -537,7 +695,7 @@ def parse_timetable_image(
             if is_line18:
                 # Use special parser for Line 18
                 results.extend(parse_line18_format(
-                    grayscale_img, binary_img, image_path, route_stations, suffix
+                    grayscale_img, binary_img, image_path, route_stations, suffix, annotate
                 ))
             else:
                 # Use standard parser for other lines
@@ -548,17 +706,33 @@ def parse_timetable_image(
                     f"annotations/{Path(image_path).stem}{suffix}_binary.png"
                 )
 
-                # Perform OCR on grayscale for destination and operating_time
-                ocr_gray = ocrmac.OCR(grayscale_img, framework="livetext")
-                annotations_gray = ocr_gray.recognize()
-                ocr_gray.annotate_PIL().save(annotation_path_gray)
+                # Perform OCR on binary image for schedule_times
+                annotations_binary = recognize_text(
+                    binary_img,
+                    annotation_path=annotation_path_binary if annotate else None,
+                )
 
-                # Group text by lines for grayscale OCR
-                lines_gray = group_text_by_lines(annotations_gray)
+                # Group text by lines for binary OCR
+                lines_binary = group_text_by_lines(annotations_binary)
 
-                # Extract destination and operating_time from grayscale
-                destination = extract_destination(lines_gray)
-                operating_time = extract_operating_time(lines_gray)
+                # The header is large, high-contrast text that usually survives
+                # binarization; only fall back to grayscale OCR if it did not
+                destination = extract_destination(lines_binary)
+                operating_time = extract_operating_time(lines_binary)
+
+                if destination is None or operating_time is None:
+                    # Perform OCR on grayscale for destination and operating_time
+                    annotations_gray = recognize_text(
+                        grayscale_img,
+                        annotation_path=annotation_path_gray if annotate else None,
+                    )
+
+                    # Group text by lines for grayscale OCR
+                    lines_gray = group_text_by_lines(annotations_gray)
+
+                    # Extract destination and operating_time from grayscale
+                    destination = extract_destination(lines_gray) or destination
+                    operating_time = extract_operating_time(lines_gray) or operating_time
 
                 # Auto-correct destination using route stations
                 if route_stations and route and destination:
@@ -569,32 +743,14 @@ def parse_timetable_image(
                         print(f"Auto-correct: '{destination}' -> '{corrected_destination}'")
                     destination = corrected_destination
 
-                # Perform OCR on binary image for schedule_times
-                ocr_binary = ocrmac.OCR(binary_img, framework="livetext")
-                annotations_binary = ocr_binary.recognize()
-                ocr_binary.annotate_PIL().save(annotation_path_binary)
-
-                # Group text by lines for binary OCR
-                lines_binary = group_text_by_lines(annotations_binary)
-
                 # Extract schedule_times from binary
                 schedule_times = extract_schedule_times(lines_binary)
 
                 # Debug
-                print(
+                print_schedule(
                     f"线路-{route}, 站名-{station}, 开往-{destination}, 时段-{operating_time}",
+                    schedule_times,
                 )
-                minutes = {}
-                for time in schedule_times:
-                    hour, minute = map(int, time.split(":"))
-                    minutes[hour] = minutes.get(hour, []) + [minute]
-                for hour, mins in sorted(
-                    minutes.items(), key=lambda x: 24 if x[0] == 0 else x[0]
-                ):
-                    print(f"{hour:02}:", end="")
-                    for minute in mins:
-                        print(f" {minute:02}", end="")
-                    print()
 
                 result = {
                     "filename": os.path.basename(image_path) + suffix,
@@ -629,6 +785,11 @@ def main():
 
     parser = argparse.ArgumentParser(description="Parse timetable images using OCR")
     parser.add_argument("-l", "--line", type=str, help="Specific line to process (e.g., 18)")
+    parser.add_argument(
+        "--annotate",
+        action="store_true",
+        help="Save OCR annotation images to annotations/ for debugging",
+    )
     args = parser.parse_args()
 
     timetables_dir = Path("timetables")
@@ -640,11 +801,7 @@ def main():
         return
 
     # Find all image files
-    image_extensions = {".jpg", ".jpeg", ".png"}
-    image_files = []
-
-    for ext in image_extensions:
-        image_files.extend(timetables_dir.glob(f"*{ext}"))
+    image_files = list_image_files(timetables_dir)
 
     # Filter by line if specified
     if args.line:
@@ -680,15 +837,17 @@ def main():
     failed = 0
 
     with ProcessPoolExecutor(max_workers=max_workers) as executor, open(
-        output_file, "w", encoding="utf-8"
+        output_file, "w", encoding="utf-8", buffering=1 << 16
     ) as fout:
         # Create partial function with route_stations
-        parse_func = partial(parse_timetable_image, route_stations=route_stations)
+        parse_func = partial(
+            parse_timetable_image, route_stations=route_stations, annotate=args.annotate
+        )
 
         # Submit all tasks
         future_to_path = {
             executor.submit(parse_func, str(image_path)): image_path
-            for image_path in sorted(image_files)
+            for image_path in image_files
         }
 
         # Process completed tasks
@@ -696,7 +855,7 @@ def main():
         for i, future in enumerate(as_completed(future_to_path)):
             results_list = future.result()
             for result in results_list:
-                print(json.dumps(result, ensure_ascii=False), file=fout, flush=True)
+                fout.write(json.dumps(result, ensure_ascii=False) + "\n")
 
                 if "error" not in result:
                     successful += 1
@@ -707,6 +866,10 @@ def main():
                         f"❌ [{i}/{n}]: {result['filename']}: {result.get('error', 'Unknown error')}"
                     )
 
+            # Flush periodically so partial results survive an interrupted run
+            if i % JSONL_FLUSH_INTERVAL == 0:
+                fout.flush()
+
     print(f"\nResults written to {output_file}")
     print(f"Successfully processed: {successful}")
     print(f"Failed: {failed}")
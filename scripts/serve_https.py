@@ -5,68 +5,213 @@ Usage: python3 serve_https.py [port]
 Default port: 8443
 """
 
+import functools
+import hashlib
 import http.server
 import ssl
-import socketserver
 import os
+import shutil
 import sys
 import tempfile
 import subprocess
+import datetime
 from pathlib import Path
 
+try:
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.x509.oid import NameOID
+except ImportError:
+    x509 = None  # Fall back to the openssl command line tool
+
+# Identity of the leaf certificate; changing any of these yields a new cert file
+CERT_COMMON_NAME = 'localhost'
+CERT_SAN_DNS_NAMES = ('localhost',)
+CERT_KEY_ALGORITHM = 'ec-p256'
+
+def cert_cache_key():
+    """Short hash of the certificate's CN, SANs and key algorithm"""
+    identity = repr((CERT_COMMON_NAME, sorted(CERT_SAN_DNS_NAMES), CERT_KEY_ALGORITHM))
+    return hashlib.blake2b(identity.encode(), digest_size=8).hexdigest()
+
+def _write_file_atomic(path, data, mode=0o600):
+    """Write data via a temporary file and rename, so a crash never leaves a partial file"""
+    temp_path = f"{path}.tmp"
+    fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, mode)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+def _create_cert_with_cryptography(cert_path, key_path):
+    """Create a self-signed certificate for localhost in-process"""
+    # P-256 keys are much faster to generate and handshake with than RSA-2048
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([
+        x509.NameAttribute(NameOID.COUNTRY_NAME, 'CN'),
+        x509.NameAttribute(NameOID.STATE_OR_PROVINCE_NAME, 'Beijing'),
+        x509.NameAttribute(NameOID.LOCALITY_NAME, 'Beijing'),
+        x509.NameAttribute(NameOID.ORGANIZATION_NAME, 'LocalDev'),
+        x509.NameAttribute(NameOID.ORGANIZATIONAL_UNIT_NAME, 'IT'),
+        x509.NameAttribute(NameOID.COMMON_NAME, CERT_COMMON_NAME),
+    ])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now)
+        .not_valid_after(now + datetime.timedelta(days=365))
+        .add_extension(
+            x509.SubjectAlternativeName([x509.DNSName(dns) for dns in CERT_SAN_DNS_NAMES]),
+            critical=False,
+        )
+        .sign(key, hashes.SHA256())
+    )
+    _write_file_atomic(key_path, key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.TraditionalOpenSSL,
+        serialization.NoEncryption(),
+    ))
+    _write_file_atomic(cert_path, cert.public_bytes(serialization.Encoding.PEM), 0o644)
+
 def create_self_signed_cert(cert_path, key_path):
     """Create a self-signed certificate for localhost"""
+    if x509 is not None:
+        try:
+            _create_cert_with_cryptography(cert_path, key_path)
+            print(f"✓ Created SSL certificate: {cert_path}")
+            print(f"✓ Created SSL key: {key_path}")
+            return True
+        except (ValueError, OSError) as e:
+            print(f"✗ Failed to create SSL certificate: {e}")
+            return False
+
     cmd = [
-        'openssl', 'req', '-x509', '-newkey', 'rsa:2048',
+        'openssl', 'req', '-x509', '-sha256',
+        '-newkey', 'ec', '-pkeyopt', 'ec_paramgen_curve:P-256',
         '-keyout', key_path, '-out', cert_path,
         '-days', '365', '-nodes',
-        '-subj', '/C=CN/ST=Beijing/L=Beijing/O=LocalDev/OU=IT/CN=localhost'
+        '-subj', f'/C=CN/ST=Beijing/L=Beijing/O=LocalDev/OU=IT/CN={CERT_COMMON_NAME}',
+        '-addext', 'subjectAltName=' + ','.join(f'DNS:{dns}' for dns in CERT_SAN_DNS_NAMES),
     ]
     
     try:
-        subprocess.run(cmd, check=True, capture_output=True)
+        # Only stderr is of interest, and only when openssl fails
+        subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
         print(f"✓ Created SSL certificate: {cert_path}")
         print(f"✓ Created SSL key: {key_path}")
         return True
     except subprocess.CalledProcessError as e:
         print(f"✗ Failed to create SSL certificate: {e}")
+        if e.stderr:
+            print(e.stderr.decode(errors='replace').strip())
         return False
     except FileNotFoundError:
         print("✗ OpenSSL not found. Please install OpenSSL to use HTTPS.")
         return False
 
+class DevServer(http.server.ThreadingHTTPServer):
+    """HTTP server tuned for quick restarts and many parallel asset requests
+
+    Each connection is handled (and its TLS handshake done) in its own thread.
+    """
+    daemon_threads = True  # Don't wait for open connections on shutdown
+    allow_reuse_address = True  # Restart while old connections are in TIME_WAIT
+    allow_reuse_port = False  # A second server on the same port must fail, not share it
+    request_queue_size = 128
+
+    ssl_context = None  # Set to serve HTTPS
+
+    def get_request(self):
+        sock, addr = self.socket.accept()
+        if self.ssl_context is not None:
+            # Defer the handshake so a slow client can't block the accept loop
+            sock = self.ssl_context.wrap_socket(
+                sock, server_side=True, do_handshake_on_connect=False
+            )
+        return sock, addr
+
+    def finish_request(self, request, client_address):
+        # Runs in the connection's own thread
+        if self.ssl_context is not None:
+            try:
+                request.do_handshake()
+            except (ssl.SSLError, OSError):
+                return  # Failed handshake; shutdown_request closes the socket
+        super().finish_request(request, client_address)
+
+class DevRequestHandler(http.server.SimpleHTTPRequestHandler):
+    """Static file handler that avoids copying file data through Python when it can"""
+    copy_bufsize = 256 * 1024
+    disable_nagle_algorithm = True  # Don't delay small responses and TLS records
+
+    def copyfile(self, source, outputfile):
+        if isinstance(self.connection, ssl.SSLSocket):
+            # Data must pass through OpenSSL; larger chunks mean fewer Python-level writes
+            shutil.copyfileobj(source, outputfile, self.copy_bufsize)
+        else:
+            # Plain HTTP: zero-copy sendfile(2); headers are already flushed
+            self.connection.sendfile(source)
+
+@functools.lru_cache(maxsize=None)
+def _load_ssl_context(cert_path, key_path, cert_mtime, key_mtime):
+    """Build a server SSL context (mtimes are part of the cache key)"""
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    # TLS 1.2 suites limited to forward-secret AES-GCM; TLS 1.3 suites are unaffected
+    context.set_ciphers('ECDHE+AESGCM')
+    context.options |= ssl.OP_NO_COMPRESSION
+    # Session tickets let the browser's many asset connections resume instead of
+    # doing a full handshake (OpenSSL's server-side session cache is on by default)
+    context.options &= ~ssl.OP_NO_TICKET
+    context.num_tickets = 4
+    context.load_cert_chain(cert_path, key_path)
+    return context
+
+def get_ssl_context(cert_path, key_path):
+    """Return the SSL context for the certificate, rebuilt only if the files changed"""
+    return _load_ssl_context(
+        cert_path, key_path,
+        os.stat(cert_path).st_mtime_ns, os.stat(key_path).st_mtime_ns
+    )
+
 def main():
     port = int(sys.argv[1]) if len(sys.argv) > 1 else 8443
     
-    # Certificate paths
+    # Certificate paths, reused across runs while the certificate identity is unchanged
     temp_dir = tempfile.gettempdir()
-    cert_path = os.path.join(temp_dir, 'server.crt')
-    key_path = os.path.join(temp_dir, 'server.key')
+    cert_name = f'server-{cert_cache_key()}'
+    cert_path = os.path.join(temp_dir, f'{cert_name}.crt')
+    key_path = os.path.join(temp_dir, f'{cert_name}.key')
     
     # Create certificate if it doesn't exist
-    if not (os.path.exists(cert_path) and os.path.exists(key_path)):
+    have_cert = os.path.exists(cert_path) and os.path.exists(key_path)
+    if not have_cert:
         print("Creating SSL certificate...")
-        if not create_self_signed_cert(cert_path, key_path):
+        have_cert = create_self_signed_cert(cert_path, key_path)
+        if not have_cert:
             print("Falling back to HTTP...")
             port = 8000 if port == 8443 else port
+
+    scheme = 'https' if have_cert else 'http'
             
-    print(f'Starting {"HTTPS" if os.path.exists(cert_path) else "HTTP"} server...')
+    print(f'Starting {scheme.upper()} server...')
     print(f'Port: {port}')
     print(f'Directory: {os.getcwd()}')
-    print(f'URL: {"https" if os.path.exists(cert_path) else "http"}://localhost:{port}/')
+    print(f'URL: {scheme}://localhost:{port}/')
     print('-' * 50)
     
     # Create server
-    Handler = http.server.SimpleHTTPRequestHandler
+    Handler = DevRequestHandler
     
-    with socketserver.TCPServer(('', port), Handler) as httpd:
-        if os.path.exists(cert_path) and os.path.exists(key_path):
+    with DevServer(('', port), Handler) as httpd:
+        if have_cert:
             # Setup SSL
-            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
-            context.load_cert_chain(cert_path, key_path)
-            httpd.socket = context.wrap_socket(httpd.socket, server_side=True)
+            httpd.ssl_context = get_ssl_context(cert_path, key_path)
             
-        print(f'✓ Server running at {"https" if os.path.exists(cert_path) else "http"}://localhost:{port}/')
+        print(f'✓ Server running at {scheme}://localhost:{port}/')
         print('Press Ctrl+C to stop')
         
         try:
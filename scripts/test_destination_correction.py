@@ -5,8 +5,32 @@ Reads destinations from destinations.txt and shows before/after corrections.
 """
 
 import csv
+import sys
+from collections import defaultdict
 from pathlib import Path
-from parse_timetables import parse_station_names_from_files, auto_correct_destination
+
+from parse_timetables import (
+    auto_correct_destinations,
+    list_image_files,
+    parse_station_names_from_files,
+)
+
+
+def correct_destinations(entries, route_stations):
+    """
+    Auto-correct all (route, destination) entries, one batch per route.
+    Returns a dict mapping (route, destination) to the corrected name.
+    """
+    by_route = defaultdict(set)
+    for route, destination in entries:
+        by_route[route].add(destination)
+
+    corrections = {}
+    for route, destinations in by_route.items():
+        destinations = sorted(destinations)
+        corrected = auto_correct_destinations(destinations, route, route_stations)
+        corrections.update(((route, d), c) for d, c in zip(destinations, corrected))
+    return corrections
 
 
 def main():
@@ -19,11 +43,7 @@ def main():
         return
 
     # Find all image files
-    image_extensions = {".jpg", ".jpeg", ".png"}
-    image_files = []
-
-    for ext in image_extensions:
-        image_files.extend(timetables_dir.glob(f"*{ext}"))
+    image_files = list_image_files(timetables_dir)
 
     if not image_files:
         print("No image files found in timetables directory")
@@ -33,6 +53,10 @@ def main():
     route_stations = parse_station_names_from_files(image_files)
     print(f"Found stations for {len(route_stations)} routes")
 
+    # Sets for the validity check; matching keeps the ordered tuples so ties
+    # resolve the same way as in parse_timetables
+    station_sets = {r: frozenset(s) for r, s in route_stations.items()}
+
     # Print route stations for reference
     print("\n=== Station names by route ===")
     for route, stations in sorted(route_stations.items()):
@@ -50,57 +74,58 @@ def main():
     total_entries = 0
     failed_entries = 0
 
-    # Store all results for sorting
-    results = []
-
-    with open(destinations_file, "r", encoding="utf-8") as f:
+    # newline="" as the csv docs require; the C reader handles line endings itself
+    with open(destinations_file, "r", encoding="utf-8", newline="") as f:
         reader = csv.reader(f)
         header = next(reader, None)  # Skip header
 
         if header:
             print(f"Header: {header}")
 
-        for row in reader:
-            if len(row) >= 2:
-                route = row[0].strip()
-                destination = row[1].strip()
-
-                if not destination:  # Skip empty destinations
-                    continue
-
-                total_entries += 1
+        # Strip each field once; rows with an empty destination are skipped
+        stripped = ((row[0].strip(), row[1].strip()) for row in reader if len(row) >= 2)
+        entries = [(route, destination) for route, destination in stripped if destination]
 
-                # Apply auto-correction
-                corrected = auto_correct_destination(destination, route, route_stations)
+    # Apply auto-correction
+    corrections = correct_destinations(entries, route_stations)
 
-                # Check if corrected result is a valid station name
-                is_valid_station = (
-                    route in route_stations and corrected in route_stations[route]
-                )
+    # Results bucketed by status, in print order
+    corrected_results, ok, failed = [], [], []
 
-                if not is_valid_station:
-                    status = "❌ FAILED"
-                    status_priority = 3
-                    failed_entries += 1
-                elif corrected != destination:
-                    status = "✓ CORRECTED"
-                    status_priority = 1
-                    corrections_made += 1
-                else:
-                    status = "✓ OK"
-                    status_priority = 2
+    for route, destination in entries:
+        total_entries += 1
+        corrected = corrections[route, destination]
 
-                results.append((status_priority, route, destination, corrected, status))
+        # Check if corrected result is a valid station name
+        is_valid_station = corrected in station_sets.get(route, ())
 
-    # Sort results: first by status priority, then by route
-    results.sort(key=lambda x: (x[0], x[1]))
+        if not is_valid_station:
+            bucket = failed
+            failed_entries += 1
+        elif corrected != destination:
+            bucket = corrected_results
+            corrections_made += 1
+        else:
+            bucket = ok
+        bucket.append((route, destination, corrected))
 
-    # Print sorted results
+    # Print results: corrected first, then OK, then failed; each sorted by route
     print(f"{'Route':<8} {'Original':<20} {'Corrected':<20} {'Status'}")
     print("-" * 60)
 
-    for _, route, destination, corrected, status in results:
-        print(f"{route:<8} {destination:<20} {corrected:<20} {status}")
+    lines = []
+    for status, bucket in (
+        ("✓ CORRECTED", corrected_results),
+        ("✓ OK", ok),
+        ("❌ FAILED", failed),
+    ):
+        bucket.sort(key=lambda x: x[0])
+        lines.extend(
+            f"{route:<8} {destination:<20} {corrected:<20} {status}"
+            for route, destination, corrected in bucket
+        )
+    if lines:
+        sys.stdout.write("\n".join(lines) + "\n")
 
     print("-" * 60)
     print(f"Total entries: {total_entries}")